@@ -0,0 +1,54 @@
+"""add composite indexes for list queries
+
+Revision ID: 68990e4cbd92
+Revises: a84b5ac15aaa
+Create Date: 2026-10-16 03:00:12.412087+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '68990e4cbd92'
+down_revision: Union[str, Sequence[str], None] = 'a84b5ac15aaa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, and it avoids
+    # locking out writes to documents while the indexes build.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_profile_id_updated_at',
+            'documents',
+            ['profile_id', sa.text('updated_at DESC')],
+            unique=False,
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_document_versions_document_id_saved_at',
+            'document_versions',
+            ['document_id', sa.text('saved_at DESC')],
+            unique=False,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_document_versions_document_id_saved_at',
+            table_name='document_versions',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_documents_profile_id_updated_at',
+            table_name='documents',
+            postgresql_concurrently=True
+        )
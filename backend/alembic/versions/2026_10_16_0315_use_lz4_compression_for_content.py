@@ -0,0 +1,34 @@
+"""use lz4 compression for content
+
+Revision ID: 3e5ed7c325d7
+Revises: 68990e4cbd92
+Create Date: 2026-10-16 03:15:41.208533+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e5ed7c325d7'
+down_revision: Union[str, Sequence[str], None] = '68990e4cbd92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Large TipTap HTML values are already compressed and moved out of line
+    # (TOAST). LZ4 (Postgres 14+) decompresses several times faster than the
+    # default pglz, which is what every full document fetch pays for. This is
+    # metadata-only: existing values keep their compression until rewritten.
+    op.execute("ALTER TABLE documents ALTER COLUMN content SET COMPRESSION lz4")
+    op.execute("ALTER TABLE document_versions ALTER COLUMN content SET COMPRESSION lz4")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE document_versions ALTER COLUMN content SET COMPRESSION pglz")
+    op.execute("ALTER TABLE documents ALTER COLUMN content SET COMPRESSION pglz")
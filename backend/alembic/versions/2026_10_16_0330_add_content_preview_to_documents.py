@@ -0,0 +1,73 @@
+"""add content preview to documents
+
+Revision ID: f33da79fd3ef
+Revises: 3e5ed7c325d7
+Create Date: 2026-10-16 03:30:27.650194+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.previews import create_content_preview
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f33da79fd3ef'
+down_revision: Union[str, Sequence[str], None] = '3e5ed7c325d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows read and rewritten per backfill round trip
+BACKFILL_BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('content_preview', sa.Text(), nullable=True))
+
+    # Offline (--sql) runs can't read rows back; previews there stay empty
+    # until each document is next saved.
+    if op.get_context().as_sql:
+        return
+
+    # Backfill existing rows with the same helper the app uses on write. Walk
+    # the table by primary key in batches so large tables never sit in memory
+    # at once, and write each batch back with a single executemany UPDATE.
+    documents = sa.table(
+        'documents',
+        sa.column('id', sa.UUID()),
+        sa.column('content', sa.Text()),
+        sa.column('content_preview', sa.Text()),
+    )
+    update_stmt = (
+        sa.update(documents)
+        .where(documents.c.id == sa.bindparam('b_id'))
+        .values(content_preview=sa.bindparam('b_preview'))
+    )
+
+    bind = op.get_bind()
+    last_id = None
+    while True:
+        query = (
+            sa.select(documents.c.id, documents.c.content)
+            .order_by(documents.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        )
+        if last_id is not None:
+            query = query.where(documents.c.id > last_id)
+        rows = bind.execute(query).all()
+        if not rows:
+            break
+
+        bind.execute(update_stmt, [
+            {"b_id": row.id, "b_preview": create_content_preview(row.content or "")}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'content_preview')
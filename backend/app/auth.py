@@ -1,18 +1,28 @@
 # /backend/app/auth.py
 
 import os
+import time
+import hmac
+import base64
+import hashlib
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, case, or_, func, bindparam, lambda_stmt
 from uuid import UUID
 from jose import jwt, JWTError
+import orjson
 
-from .database import get_db_session
+from .database import get_db_session, AsyncSessionLocal
 from .models import Profile
 
+logger = logging.getLogger(__name__)
+
 # Security scheme for extracting Bearer tokens
 security = HTTPBearer()
 
@@ -23,6 +33,120 @@ SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 if not SUPABASE_URL or not SUPABASE_JWT_SECRET:
     raise ValueError("SUPABASE_URL and SUPABASE_JWT_SECRET environment variables must be set")
 
+# Decode settings are built once rather than per call
+_JWT_SECRET_BYTES = SUPABASE_JWT_SECRET.encode("utf-8")
+_JWT_ALGORITHMS = ("HS256",)
+_JWT_AUDIENCE = "authenticated"
+_JWT_OPTIONS = {"verify_aud": True, "verify_exp": True}
+
+# --- Verified Token Cache ---
+# Clients reuse the same Supabase access token for its whole lifetime (~1 hour),
+# so we keep each verified payload until the token's own `exp` claim and skip
+# the signature check on repeat requests. The cache is LRU-bounded so a client
+# spraying distinct tokens can't grow it without limit. Entries are keyed by a
+# 16-byte BLAKE2b digest of the token rather than the ~1 KB token itself.
+JWT_CACHE_MAX_SIZE = 10_000
+_verified_tokens: "OrderedDict[bytes, dict]" = OrderedDict()
+
+
+def _token_cache_key(token: str) -> bytes:
+    """Return the verify-cache key for a raw token."""
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def _get_cached_payload(token: str) -> Optional[dict]:
+    """Return the cached payload for a token if it is still unexpired."""
+    key = _token_cache_key(token)
+    payload = _verified_tokens.get(key)
+    if payload is None:
+        return None
+
+    if payload["exp"] <= time.time():
+        # Token expired since it was cached; force a full verify (which will fail)
+        del _verified_tokens[key]
+        return None
+
+    _verified_tokens.move_to_end(key)
+    return payload
+
+
+def _cache_payload(token: str, payload: dict) -> None:
+    """Cache a verified payload, evicting the least recently used entry if full."""
+    # Only tokens that carry an expiry can be cached safely
+    if not isinstance(payload.get("exp"), (int, float)):
+        return
+
+    key = _token_cache_key(token)
+    _verified_tokens[key] = payload
+    _verified_tokens.move_to_end(key)
+    if len(_verified_tokens) > JWT_CACHE_MAX_SIZE:
+        _verified_tokens.popitem(last=False)
+
+
+def _b64url_decode(segment: str) -> bytes:
+    """Decode an unpadded base64url JWT segment."""
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _verify_hs256(token: str) -> Optional[dict]:
+    """
+    Verify an HS256 token with hmac/hashlib directly instead of going through jose.
+    
+    Supabase signs every access token with HS256, so this covers the normal
+    case with a single HMAC and two JSON parses.
+    
+    Args:
+        token: The JWT token to verify
+        
+    Returns:
+        dict: The decoded payload, or None if the token isn't a well-formed
+        HS256 JWT (the caller then falls back to jose)
+        
+    Raises:
+        JWTError: If the signature, expiry or audience check fails
+    """
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = orjson.loads(_b64url_decode(header_segment))
+        signature = _b64url_decode(signature_segment)
+        signing_input = f"{header_segment}.{payload_segment}".encode("ascii")
+    except ValueError:
+        # Covers bad segment counts, base64, JSON and non-ASCII input
+        return None
+    
+    if not isinstance(header, dict) or header.get("alg") != "HS256":
+        return None
+    
+    expected = hmac.new(_JWT_SECRET_BYTES, signing_input, hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise JWTError("Signature verification failed")
+    
+    try:
+        payload = orjson.loads(_b64url_decode(payload_segment))
+    except ValueError:
+        raise JWTError("Invalid payload")
+    if not isinstance(payload, dict):
+        raise JWTError("Invalid payload")
+    
+    now = time.time()
+    
+    # Unlike jose, `exp` is required: the verify cache relies on it
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= now:
+        raise JWTError("Signature has expired")
+    
+    nbf = payload.get("nbf")
+    if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+        raise JWTError("The token is not yet valid (nbf)")
+    
+    aud = payload.get("aud")
+    if isinstance(aud, str):
+        aud = [aud]
+    if not isinstance(aud, list) or _JWT_AUDIENCE not in aud:
+        raise JWTError("Invalid audience")
+    
+    return payload
+
 
 async def verify_jwt_token(token: str) -> dict:
     """
@@ -37,15 +161,27 @@ async def verify_jwt_token(token: str) -> dict:
     Raises:
         HTTPException: If token is invalid or expired
     """
+    cached_payload = _get_cached_payload(token)
+    if cached_payload is not None:
+        return cached_payload
+
     try:
-        # Decode the JWT token using the Supabase secret
-        payload = jwt.decode(
-            token,
-            SUPABASE_JWT_SECRET,
-            algorithms=["HS256"],
-            audience="authenticated"
-        )
-        return payload
+        # Supabase HS256 tokens are verified inline by the stdlib fast path,
+        # which costs microseconds
+        payload = _verify_hs256(token)
+        
+        if payload is None:
+            # Anything else goes through jose, which rejects unexpected
+            # algorithms. The decode is pure CPU, so it runs in a worker thread
+            # to keep a burst of such tokens off the event loop.
+            payload = await asyncio.to_thread(
+                jwt.decode,
+                token,
+                _JWT_SECRET_BYTES,
+                algorithms=_JWT_ALGORITHMS,
+                audience=_JWT_AUDIENCE,
+                options=_JWT_OPTIONS
+            )
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -53,6 +189,10 @@ async def verify_jwt_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Failed verifications are never cached
+    _cache_payload(token, payload)
+    return payload
+
 
 async def get_current_user_id(
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -109,10 +249,9 @@ async def get_current_user_profile(
     Raises:
         HTTPException: If profile not found
     """
-    result = await db.execute(
-        select(Profile).where(Profile.id == user_id)
-    )
-    profile = result.scalar_one_or_none()
+    # Primary-key lookup: served from the session's identity map when another
+    # dependency already loaded the row, otherwise a single cached SELECT
+    profile = await db.get(Profile, user_id)
     
     if not profile:
         raise HTTPException(
@@ -128,79 +267,262 @@ async def get_current_user_profile(
 get_current_user = get_current_user_id 
 
 
+# --- Rate Limit Counters ---
+# Calls are counted in memory and written to Postgres in batches by a
+# background flusher (see main.py lifespan), so a burst of 100 calls costs one
+# UPDATE instead of 100. Other workers see a user's calls after the next
+# flush, which is an acceptable drift for hourly limits.
+RATE_LIMIT_WINDOW = timedelta(hours=1)
+RATE_LIMIT_FLUSH_INTERVAL = 1  # seconds
+
+# Users comfortably under their limit are checked against a local snapshot of
+# the stored counter for up to RATE_LIMIT_SNAPSHOT_TTL seconds. Once a user is
+# past RATE_LIMIT_NEAR_FRACTION of a limit, calls made on other workers start
+# to matter, so their snapshot is re-read after every flush instead.
+RATE_LIMIT_SNAPSHOT_TTL = 30  # seconds
+RATE_LIMIT_NEAR_FRACTION = 0.8
+
+# Calls admitted by this process that haven't been written to the database yet
+_pending_api_calls: defaultdict[UUID, int] = defaultdict(int)
+
+# Calls taken out of _pending_api_calls by a flush whose UPDATE hasn't
+# committed yet. They still count toward usage until the flush either folds
+# them into the snapshots or puts them back into _pending_api_calls.
+_inflight_api_calls: defaultdict[UUID, int] = defaultdict(int)
+
+# Persisted (api_call_count, rate_limit_reset_at, fetched_at) per user, where
+# fetched_at is the time.monotonic() of the database read. Most checks are then
+# a dict lookup; the flusher folds the calls it persists into the snapshots.
+_usage_snapshots: dict[UUID, tuple[int, datetime, float]] = {}
+
+# The per-request usage lookup is built as a lambda statement so SQLAlchemy
+# caches its construction and compiled SQL by the lambda's code object. Only the
+# SQL string is cached client-side, so this is safe behind PgBouncer.
+_RATE_LIMIT_USAGE_BY_ID = lambda_stmt(
+    lambda: select(Profile.api_call_count, Profile.rate_limit_reset_at)
+    .where(Profile.id == bindparam("uid"))
+)
+
+
+def _unpersisted_calls(user_id: UUID) -> int:
+    """Calls admitted by this process that aren't committed to the database yet."""
+    # Read with get() so checks don't insert zero entries that the flusher
+    # would then write back as no-op UPDATEs
+    return _pending_api_calls.get(user_id, 0) + _inflight_api_calls.get(user_id, 0)
+
+
+async def reserve_api_calls(
+    user_id: UUID,
+    calls: int,
+    requests_per_hour: int,
+    db: AsyncSession
+) -> None:
+    """
+    Reserve `calls` units of a user's hourly LLM budget in one step.
+    
+    Routes that fan a single request out into several LLM calls can reserve
+    the whole batch at once instead of checking the limit per call. Either all
+    of the calls are admitted or none are.
+    
+    Args:
+        user_id: The authenticated user's ID
+        calls: Number of calls to reserve
+        requests_per_hour: Maximum calls allowed per hour for this route
+        db: Database session
+        
+    Raises:
+        HTTPException: 404 if the profile doesn't exist, 429 if the reservation
+        would exceed the rate limit
+    """
+    now = time.monotonic()
+    snapshot = _usage_snapshots.get(user_id)
+    if snapshot is not None:
+        api_call_count, rate_limit_reset_at, fetched_at = snapshot
+        age = now - fetched_at
+        near_limit = (
+            api_call_count + _unpersisted_calls(user_id) + calls
+            > requests_per_hour * RATE_LIMIT_NEAR_FRACTION
+        )
+        if age >= RATE_LIMIT_SNAPSHOT_TTL or (near_limit and age >= RATE_LIMIT_FLUSH_INTERVAL):
+            snapshot = None
+    
+    if snapshot is None:
+        result = await db.execute(_RATE_LIMIT_USAGE_BY_ID, {"uid": user_id})
+        row = result.one_or_none()
+        
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User profile not found"
+            )
+        api_call_count, rate_limit_reset_at = row
+        fetched_at = now
+    
+    current_time = datetime.now(timezone.utc)
+    
+    # If the stored window is over, this call opens a new one. The flusher
+    # resets the persisted counter when it writes the pending calls.
+    if rate_limit_reset_at is None or current_time >= rate_limit_reset_at:
+        api_call_count = 0
+        rate_limit_reset_at = current_time + RATE_LIMIT_WINDOW
+    _usage_snapshots[user_id] = (api_call_count, rate_limit_reset_at, fetched_at)
+    
+    # Usage is what has been persisted plus what this process hasn't flushed
+    # yet, including calls a running flush is still writing
+    pending_calls = _unpersisted_calls(user_id)
+    current_usage = api_call_count + pending_calls
+    
+    if current_usage + calls > requests_per_hour:
+        # Calculate seconds until reset
+        seconds_until_reset = int((rate_limit_reset_at - current_time).total_seconds())
+        
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "Rate limit exceeded",
+                "message": f"You have exceeded the rate limit of {requests_per_hour} requests per hour for this feature.",
+                "current_usage": current_usage,
+                "limit": requests_per_hour,
+                "reset_in_seconds": seconds_until_reset
+            },
+            headers={"Retry-After": str(seconds_until_reset)}
+        )
+    
+    # Record the calls; they reach the database on the next flush
+    _pending_api_calls[user_id] += calls
+
+
 async def check_rate_limit(
     requests_per_hour: int = 100,
-    current_profile: Profile = Depends(get_current_user_profile),
+    user_id: UUID = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db_session)
-) -> Profile:
+) -> UUID:
     """
     Check and enforce per-user rate limits for LLM API calls.
     
+    Only the user ID from the JWT is needed, so rate-limited routes don't pay
+    for loading the full profile row on every call.
+    
     Args:
         requests_per_hour: Maximum requests allowed per hour for this route
-        current_profile: The authenticated user's profile
+        user_id: The authenticated user's ID
         db: Database session
         
     Returns:
-        Profile: The user's profile (for use in the protected route)
+        UUID: The user's ID (for use in the protected route)
         
     Raises:
-        HTTPException: 429 if rate limit exceeded
+        HTTPException: 404 if the profile doesn't exist, 429 if rate limit exceeded
     """
-    current_time = datetime.now(timezone.utc)
+    await reserve_api_calls(user_id, 1, requests_per_hour, db)
+    return user_id
+
+
+async def flush_pending_api_calls() -> None:
+    """
+    Write the API calls recorded since the last flush to the profiles table.
     
-    # Check if we need to reset the rate limit window
-    if (current_profile.rate_limit_reset_at is None or 
-        current_time >= current_profile.rate_limit_reset_at):
-        
-        # Reset the rate limit window
-        new_reset_time = current_time + timedelta(hours=1)
-        
-        # Update the profile with reset values
-        await db.execute(
-            update(Profile)
-            .where(Profile.id == current_profile.id)
-            .values(
-                api_call_count=1,
-                rate_limit_reset_at=new_reset_time
+    All users are written in one executemany UPDATE. A counter whose window has
+    expired is reset to the pending count and gets a fresh window.
+    """
+    global _pending_api_calls
+    flush_started = time.monotonic()
+    if not _pending_api_calls:
+        _prune_usage_snapshots(flush_started)
+        return
+    
+    # Swap the map out before awaiting so new calls land in a fresh one. The
+    # swapped-out calls count as in flight until the outcome is known.
+    pending, _pending_api_calls = _pending_api_calls, defaultdict(int)
+    for user_id, calls in pending.items():
+        _inflight_api_calls[user_id] += calls
+    
+    profiles = Profile.__table__
+    window_expired = or_(
+        profiles.c.rate_limit_reset_at.is_(None),
+        func.now() >= profiles.c.rate_limit_reset_at
+    )
+    stmt = (
+        update(profiles)
+        .where(profiles.c.id == bindparam("user_id"))
+        .values(
+            api_call_count=case(
+                (window_expired, bindparam("calls")),
+                else_=profiles.c.api_call_count + bindparam("calls")
+            ),
+            rate_limit_reset_at=case(
+                (window_expired, func.now() + RATE_LIMIT_WINDOW),
+                else_=profiles.c.rate_limit_reset_at
             )
         )
-        await db.commit()
-        
-        # Update the current profile object for return
-        current_profile.api_call_count = 1
-        current_profile.rate_limit_reset_at = new_reset_time
-        
-    else:
-        # Check if user has exceeded the rate limit
-        if current_profile.api_call_count >= requests_per_hour:
-            # Calculate seconds until reset
-            seconds_until_reset = int((current_profile.rate_limit_reset_at - current_time).total_seconds())
-            
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "Rate limit exceeded",
-                    "message": f"You have exceeded the rate limit of {requests_per_hour} requests per hour for this feature.",
-                    "current_usage": current_profile.api_call_count,
-                    "limit": requests_per_hour,
-                    "reset_in_seconds": seconds_until_reset
-                },
-                headers={"Retry-After": str(seconds_until_reset)}
+    )
+    
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                stmt,
+                [{"user_id": user_id, "calls": calls} for user_id, calls in pending.items()]
             )
-        
-        # Increment the API call count
-        await db.execute(
-            update(Profile)
-            .where(Profile.id == current_profile.id)
-            .values(api_call_count=current_profile.api_call_count + 1)
-        )
-        await db.commit()
-        
-        # Update the current profile object for return
-        current_profile.api_call_count += 1
+            await db.commit()
+    except Exception:
+        logger.exception("Failed to flush %d pending rate limit counters", len(pending))
+        # Move the calls back to pending so the next flush retries them
+        _settle_inflight_calls(pending)
+        for user_id, calls in pending.items():
+            _pending_api_calls[user_id] += calls
+    else:
+        # The persisted calls are now part of the stored count. Snapshots read
+        # before the commit finished may not include them, so add them there
+        # instead of forcing a re-read. (A read that raced the commit and did
+        # see them over-counts until its snapshot is refreshed, which errs on
+        # the safe side.)
+        committed_at = time.monotonic()
+        _settle_inflight_calls(pending)
+        for user_id, calls in pending.items():
+            snapshot = _usage_snapshots.get(user_id)
+            if snapshot is not None and snapshot[2] < committed_at:
+                api_call_count, rate_limit_reset_at, fetched_at = snapshot
+                _usage_snapshots[user_id] = (api_call_count + calls, rate_limit_reset_at, fetched_at)
+    finally:
+        _prune_usage_snapshots(flush_started)
+
+
+def _settle_inflight_calls(flushed: dict[UUID, int]) -> None:
+    """Remove a finished flush's calls from the in-flight counts."""
+    for user_id, calls in flushed.items():
+        remaining = _inflight_api_calls[user_id] - calls
+        if remaining:
+            _inflight_api_calls[user_id] = remaining
+        else:
+            del _inflight_api_calls[user_id]
+
+
+def _prune_usage_snapshots(now: float) -> None:
+    """Drop snapshots too old to be used again so the map stays bounded."""
+    expired = [
+        user_id for user_id, (_, _, fetched_at) in _usage_snapshots.items()
+        if now - fetched_at >= RATE_LIMIT_SNAPSHOT_TTL
+    ]
+    for user_id in expired:
+        del _usage_snapshots[user_id]
+
+
+def invalidate_usage_snapshot(user_id: UUID) -> None:
+    """
+    Forget the local usage snapshot for a user.
     
-    return current_profile
+    Call this after changing a user's stored counter outside the flusher (for
+    example an admin reset), so the next check re-reads it from the database
+    instead of trusting a snapshot for up to RATE_LIMIT_SNAPSHOT_TTL seconds.
+    """
+    _usage_snapshots.pop(user_id, None)
+
+
+async def run_rate_limit_flusher() -> None:
+    """Background task that flushes pending API call counts periodically."""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_FLUSH_INTERVAL)
+        await flush_pending_api_calls()
 
 
 def create_rate_limit_dependency(requests_per_hour: int):
@@ -213,10 +535,12 @@ def create_rate_limit_dependency(requests_per_hour: int):
     Returns:
         A FastAPI dependency function
     """
+    # FastAPI caches dependencies per request, so the user ID and session
+    # resolved here are the same objects the endpoint receives
     async def rate_limit_dependency(
-        current_profile: Profile = Depends(get_current_user_profile),
+        user_id: UUID = Depends(get_current_user_id),
         db: AsyncSession = Depends(get_db_session)
-    ) -> Profile:
-        return await check_rate_limit(requests_per_hour, current_profile, db)
+    ) -> UUID:
+        return await check_rate_limit(requests_per_hour, user_id, db)
     
     return rate_limit_dependency 
\ No newline at end of file
@@ -1,12 +1,16 @@
 # /backend/app/database.py
 
 import os
-from dotenv import load_dotenv
+import time
+from typing import AsyncGenerator
+from uuid import uuid4
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
-# Load environment variables from the .env file in the /backend directory
-load_dotenv()
+# Environment variables are loaded once at process entry (see main.py), so
+# this module only reads them.
 
 # --- Database Connection String ---
 # This is the most important part. We retrieve the connection string for your
@@ -17,15 +21,105 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-# --- SQLAlchemy Async Engine (Updated for Direct Connection) ---
+# --- Connection Pool Sizing (direct mode) ---
+# Every in-flight request holds a session for its whole dependency chain
+# (JWT verify, rate limit, route logic), so the default pool of 5 + 10 overflow
+# runs dry at modest concurrency ("QueuePool limit ... reached").
+# NOTE: These limits apply per worker process. With `gunicorn -w 4` the total
+# is 4 * (pool_size + max_overflow), which must stay within Postgres' own
+# connection budget.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))  # Replace connections older than 5 minutes
+# Connections that sat in the pool at least this long are pinged on checkout
+DB_POOL_PING_IDLE_SECONDS = int(os.getenv("DB_POOL_PING_IDLE_SECONDS", "30"))
+
+# --- Pool Mode ---
+# "direct":    We connect straight to Postgres and SQLAlchemy owns the pool.
+# "pgbouncer": We connect through a transaction-mode pooler (e.g. Supabase's
+#              pooler on port 6543). PgBouncer already multiplexes connections,
+#              so SQLAlchemy must not pool on top of it. Note that this needs
+#              `NullPool` explicitly; `poolclass=None` means "use the default
+#              QueuePool", which would double-pool.
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "direct").strip().lower()
+
+if DB_POOL_MODE not in ("direct", "pgbouncer"):
+    # Fail loudly rather than silently running with the wrong engine config
+    raise ValueError(f"DB_POOL_MODE must be 'direct' or 'pgbouncer', got '{DB_POOL_MODE}'")
+
+# --- SQLAlchemy Async Engine ---
 # The engine is the entry point to the database. It manages connections.
-# Since we are using a direct connection, we now want SQLAlchemy to manage
-# its own connection pool for high performance.
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,  # Set to True to see all generated SQL statements
-    # SQLAlchemy will now use its default, high-performance async connection pool.
-)
+if DB_POOL_MODE == "pgbouncer":
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,  # Set to True to see all generated SQL statements
+        poolclass=NullPool,
+        connect_args={
+            # Transaction pooling hands each transaction a different server
+            # connection, so no prepared statement may be assumed to exist
+            # later. Turning off asyncpg's own cache isn't enough: SQLAlchemy's
+            # dialect still prepares every statement under asyncpg's numbered
+            # names (__asyncpg_stmt_N__) and keeps a cache of its own, which
+            # leads to "prepared statement already exists / does not exist"
+            # errors across server connections. So both caches are disabled
+            # and each statement gets a unique name (SQLAlchemy's PgBouncer
+            # recipe).
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            # plan_cache_mode is deliberately left at Postgres' default ("auto"):
+            # forcing custom plans would re-plan every by-PK lookup on the auth path.
+            "server_settings": {"jit": "off"},
+        },
+    )
+else:
+    # Since we are using a direct connection, we want SQLAlchemy to manage
+    # its own connection pool for high performance.
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,  # Set to True to see all generated SQL statements
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        # No pre-ping on every checkout: it costs a round-trip per request.
+        # Connections that have been idle are pinged by the checkout hook
+        # below, and recycling well before server/proxy idle timeouts covers
+        # the rest.
+        pool_pre_ping=False,
+        pool_recycle=DB_POOL_RECYCLE,
+        # Hand out the most recently used connection so a few stay warm and
+        # the rest can sit idle until recycled
+        pool_use_lifo=True,
+        connect_args={
+            # Our queries are short OLTP lookups where JIT compilation only adds latency
+            "server_settings": {"jit": "off"},
+        },
+    )
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def _record_checkin_time(dbapi_connection, connection_record):
+        """Remember when a connection went back into the pool."""
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def _ping_idle_connection(dbapi_connection, connection_record, connection_proxy):
+        """
+        Ping a pooled connection before use if it has been idle a while.
+
+        Connections handed straight back out skip the round trip. One that sat
+        idle across a database restart or failover is caught here instead of
+        failing a user's request; the pool then drops every connection opened
+        before the failure and retries the checkout on a fresh one.
+        """
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < DB_POOL_PING_IDLE_SECONDS:
+            return
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            raise exc.InvalidatePoolError() from e
 
 # --- SQLAlchemy Async Session Factory ---
 # The async_sessionmaker creates new AsyncSession objects when called.
@@ -48,16 +142,13 @@ Base = declarative_base()
 # This function is a FastAPI dependency. When a route depends on this function,
 # FastAPI will execute it before the route's logic. It provides a clean way
 # to manage the lifecycle of a database session for a single API request.
-async def get_db_session() -> AsyncSession:
+async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency that provides a database session to the API endpoints.
     Ensures that the session is always closed after the request is finished.
     """
+    # Exiting the `async with` block closes the session whether the request
+    # succeeded or raised, so no explicit close() is needed.
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            # This block will be executed whether the request was successful
-            # or an error occurred. It ensures the session is closed.
-            await session.close()
+        yield session
 
@@ -1,22 +1,21 @@
 # /backend/app/main.py
 
 import os
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import sentry_sdk
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 
 # --- Environment Variable Loading ---
 # It's good practice to load environment variables at the very start.
-# This will load the variables from your /backend/.env file.
-load_dotenv()
-
-# --- Rate Limiter Configuration ---
-# Initialize the rate limiter with remote address as the key function
-limiter = Limiter(key_func=get_remote_address)
+# This will load the variables from your /backend/.env file. This is the only
+# place the .env file is read; the other modules just use os.getenv. Deployed
+# environments set real environment variables, so it's skipped there.
+if os.getenv("APP_ENV", "development") == "development":
+    load_dotenv()
 
 # --- Sentry Initialization ---
 # This should be done as early as possible in your application's lifecycle.
@@ -25,34 +24,89 @@ sentry_dsn = os.getenv("SENTRY_DSN_BACKEND")
 # and not during local development.
 environment = os.getenv("APP_ENV", "development")
 
+# Base fraction of requests traced; set SENTRY_TRACES_RATE=1.0 to capture
+# everything while debugging.
+SENTRY_TRACES_RATE = float(os.getenv("SENTRY_TRACES_RATE", "0.05"))
+# Paths that are always traced (the LLM-backed suggestion endpoints are the
+# ones worth full coverage) or never traced (the root health check).
+SENTRY_ALWAYS_TRACE_PREFIXES = ("/api/v1/suggestions",)
+SENTRY_NEVER_TRACE_PATHS = ("/",)
+
+
+def sentry_traces_sampler(sampling_context: dict) -> float:
+    """
+    Decide what fraction of transactions to trace for a request.
+
+    The decision is made when the request starts, so it can only look at the
+    incoming request, not the response status. Errors are still reported for
+    every request regardless of this rate.
+
+    Args:
+        sampling_context: Context passed by the Sentry SDK, including the ASGI scope
+
+    Returns:
+        float: Sample rate between 0 and 1
+    """
+    # Stay consistent with an upstream service that already decided
+    parent_sampled = sampling_context.get("parent_sampled")
+    if parent_sampled is not None:
+        return float(parent_sampled)
+
+    path = (sampling_context.get("asgi_scope") or {}).get("path", "")
+    if path in SENTRY_NEVER_TRACE_PATHS:
+        return 0.0
+    if path.startswith(SENTRY_ALWAYS_TRACE_PREFIXES):
+        return 1.0
+    return SENTRY_TRACES_RATE
+
+
 # We wrap the entire init call in a condition that checks both for a DSN
 # AND that the environment is not 'development'.
 if sentry_dsn and environment != "development":
     sentry_sdk.init(
         dsn=sentry_dsn,
-        # Set traces_sample_rate to 1.0 to capture 100%
-        # of transactions for performance monitoring.
-        # Adjust this value in production.
-        traces_sample_rate=1.0,
-        # Set profiles_sample_rate to 1.0 to profile 100%
-        # of sampled transactions.
-        # Adjust this value in production.
-        profiles_sample_rate=1.0,
+        # Tracing every request adds noticeable latency and memory under load,
+        # so only a fraction of transactions is captured
+        traces_sampler=sentry_traces_sampler,
+        # Fraction of *sampled* transactions that are also profiled. The
+        # profiler samples stacks from a background thread, so it's off unless
+        # SENTRY_PROFILES_RATE is set explicitly.
+        profiles_sample_rate=float(os.getenv("SENTRY_PROFILES_RATE", "0")),
         # Explicitly set the environment
         environment=environment,
     )
 
+# --- Application Lifespan ---
+# Starts background tasks when a worker boots and cleans them up on shutdown.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from .auth import run_rate_limit_flusher, flush_pending_api_calls
+    from .routers.import_doc import start_parse_pool, shutdown_parse_pool
+
+    # Periodically persist the in-memory rate limit counters
+    flusher = asyncio.create_task(run_rate_limit_flusher())
+    # Worker processes for parsing uploaded PDF/DOCX files
+    start_parse_pool()
+    yield
+    shutdown_parse_pool()
+    flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await flusher
+    # Write out whatever was counted since the last flush
+    await flush_pending_api_calls()
+
+
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="AI Writing Assistant Backend",
     description="API for providing real-time writing suggestions.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Render responses with orjson (a C extension) instead of the stdlib json
+    # module; list endpoints return many UUID/datetime-heavy items
+    default_response_class=ORJSONResponse
 )
 
-# Add the rate limiter to the app state
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # --- CORS (Cross-Origin Resource Sharing) Configuration ---
 # This middleware allows your Next.js frontend (running on a different domain)
 # to make requests to this FastAPI backend.
@@ -77,8 +131,12 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods (GET, POST, etc.)
-    allow_headers=["*"],  # Allows all headers
+    # Listing exactly what the frontend uses lets the middleware answer
+    # preflights with precomputed headers instead of echoing each request's
+    # Access-Control-Request-Headers back. Add to these if a route or the
+    # frontend's fetch calls start needing more.
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
 
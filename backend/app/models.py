@@ -7,7 +7,8 @@ from sqlalchemy import (
     TIMESTAMP,
     Integer,
     func,
-    UniqueConstraint
+    UniqueConstraint,
+    Index
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -66,17 +67,36 @@ class Document(Base):
     )
 
     title = Column(String(255), default="Untitled Document")
+    # Stored with LZ4 TOAST compression (set in a migration; SQLAlchemy doesn't model it)
     content = Column(Text)
+    # Plain-text preview shown in the document list. Derived from `content`
+    # on every write so listing never has to read or parse the content.
+    content_preview = Column(Text)
     created_at = Column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
+    # Updates stamp clock_timestamp() rather than now(), which is the
+    # transaction's start time: a write that started before another but
+    # committed after it would otherwise not move max(updated_at), which the
+    # document list cache relies on.
     updated_at = Column(
         TIMESTAMP(timezone=True),
         server_default=func.now(),
-        onupdate=func.now(),
+        onupdate=func.clock_timestamp(),
         nullable=False
     )
 
+    # Matches the document list query (WHERE profile_id = ? ORDER BY
+    # updated_at DESC), so Postgres can read rows in order instead of sorting.
+    __table_args__ = (
+        Index("ix_documents_profile_id_updated_at", profile_id, updated_at.desc()),
+    )
+
+    # Fetch server-generated columns (created_at, updated_at) with RETURNING as
+    # part of the INSERT/UPDATE itself, so routes don't need a refresh() SELECT
+    # after committing.
+    __mapper_args__ = {"eager_defaults": True}
+
     # A document belongs to one profile.
     profile = relationship("Profile", back_populates="documents")
 
@@ -155,3 +175,8 @@ class DocumentVersion(Base):
     # A version belongs to one document.
     document = relationship("Document", back_populates="versions")
 
+    # Matches the version history query (WHERE document_id = ? ORDER BY saved_at DESC)
+    __table_args__ = (
+        Index("ix_document_versions_document_id_saved_at", document_id, saved_at.desc()),
+    )
+
@@ -0,0 +1,73 @@
+# /backend/app/previews.py
+
+import re
+
+# Kept free of app dependencies (auth, database) so migrations can import it
+# to backfill stored previews.
+
+# Patterns used to build content previews. Compiled once since a preview is
+# computed on every document write.
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'[.!?]\s+')
+
+
+def _strip_tags_prefix(content: str, min_length: int) -> str:
+    """
+    Strip HTML tags from the start of `content`, stopping early once the
+    cleaned text is longer than `min_length` characters.
+    
+    A preview only needs its first ~120 characters, so there's no point
+    stripping the rest of a long document. The result is whitespace-collapsed
+    and stripped, and matches the first `min_length` characters of cleaning
+    the whole document.
+    """
+    pieces = []
+    raw_length = 0
+    next_check = min_length
+    position = 0
+    
+    for match in _HTML_TAG_RE.finditer(content):
+        pieces.append(content[position:match.start()])
+        raw_length += match.start() - position
+        position = match.end()
+        
+        # Only collapse once there could be enough text, and back off
+        # geometrically so whitespace-heavy documents stay linear
+        if raw_length > next_check:
+            clean_content = _WHITESPACE_RE.sub(' ', ''.join(pieces)).strip()
+            if len(clean_content) > min_length:
+                return clean_content
+            next_check = raw_length * 2
+    
+    pieces.append(content[position:])
+    return _WHITESPACE_RE.sub(' ', ''.join(pieces)).strip()
+
+
+def create_content_preview(content: str, max_length: int = 100) -> str:
+    """
+    Create a preview of the document content by taking the first sentence or ~100 characters.
+    Strips HTML tags and cleans up whitespace.
+    """
+    if not content:
+        return ""
+    
+    # Remove HTML tags (TipTap editor content might contain HTML) and clean up
+    # multiple whitespaces and newlines, only as far as the preview can reach
+    clean_content = _strip_tags_prefix(content, max_length + 20)
+    
+    if len(clean_content) <= max_length:
+        return clean_content
+    
+    # Try to find the first sentence boundary within the limit
+    sentence_end_match = _SENTENCE_END_RE.search(clean_content[:max_length + 20])
+    if sentence_end_match and sentence_end_match.start() < max_length:
+        return clean_content[:sentence_end_match.start() + 1]
+    
+    # If no sentence boundary found, truncate at word boundary
+    truncated = clean_content[:max_length]
+    last_space = truncated.rfind(' ')
+    if last_space > max_length * 0.8:  # If we can find a space reasonably close to the end
+        return truncated[:last_space] + "..."
+    
+    return truncated + "..."
@@ -1,16 +1,19 @@
 # /backend/app/routers/documents.py
 
-from typing import List
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
 from uuid import UUID
-import re
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, update, delete, and_
 from sqlalchemy.orm import selectinload
 
 from ..database import get_db_session
 from ..auth import get_current_user
 from ..models import Document, Profile, DocumentVersion
+from ..previews import create_content_preview
 from ..schemas import (
     DocumentCreate,
     DocumentUpdate,
@@ -19,44 +22,82 @@ from ..schemas import (
     DocumentListResponse,
     DocumentVersionResponse,
     DocumentVersionListResponse,
+    DocumentVersionSummary,
+    DocumentVersionSummaryListResponse,
     RestoreVersionRequest,
     RestoreVersionResponse
 )
 
 
-def create_content_preview(content: str, max_length: int = 100) -> str:
-    """
-    Create a preview of the document content by taking the first sentence or ~100 characters.
-    Strips HTML tags and cleans up whitespace.
-    """
-    if not content:
-        return ""
-    
-    # Remove HTML tags (TipTap editor content might contain HTML)
-    clean_content = re.sub(r'<[^>]+>', '', content)
-    
-    # Clean up multiple whitespaces and newlines
-    clean_content = re.sub(r'\s+', ' ', clean_content).strip()
-    
-    if len(clean_content) <= max_length:
-        return clean_content
-    
-    # Try to find the first sentence boundary within the limit
-    sentence_end_match = re.search(r'[.!?]\s+', clean_content[:max_length + 20])
-    if sentence_end_match and sentence_end_match.start() < max_length:
-        return clean_content[:sentence_end_match.start() + 1]
-    
-    # If no sentence boundary found, truncate at word boundary
-    truncated = clean_content[:max_length]
-    last_space = truncated.rfind(' ')
-    if last_space > max_length * 0.8:  # If we can find a space reasonably close to the end
-        return truncated[:last_space] + "..."
-    
-    return truncated + "..."
+# Rows fetched per round-trip when streaming the document list
+LIST_DOCUMENTS_BATCH_SIZE = 200
+
+# --- Document List Cache ---
+# Users land on the dashboard repeatedly, and the list payload only changes
+# when one of their documents is written. We keep the serialized JSON per user
+# in-process. Writes in this process evict the user's entry directly. Writes
+# made by other workers are caught by the key, the list's
+# (row count, max(updated_at)): any create, update or restore bumps the max
+# timestamp and any delete changes the count, so a stale entry is simply never
+# looked up again. The probe for that key is an index-only read of
+# ix_documents_profile_id_updated_at. Entries expire after a TTL and the cache
+# is LRU-bounded, the same pattern as the JWT verify cache.
+LIST_CACHE_TTL = 300  # seconds
+LIST_CACHE_MAX_SIZE = 1_000
+_ListCacheKey = Tuple[int, Optional[datetime]]
+_list_cache: "OrderedDict[UUID, Tuple[_ListCacheKey, float, bytes]]" = OrderedDict()
+
+
+def _get_cached_list(user_id: UUID, key: _ListCacheKey) -> Optional[bytes]:
+    """Return the cached list JSON for a user if it matches the current key."""
+    entry = _list_cache.get(user_id)
+    if entry is None:
+        return None
+
+    cached_key, expires_at, body = entry
+    if cached_key != key or expires_at <= time.monotonic():
+        del _list_cache[user_id]
+        return None
+
+    _list_cache.move_to_end(user_id)
+    return body
+
+
+def _cache_list(user_id: UUID, key: _ListCacheKey, body: bytes) -> None:
+    """Cache a user's list JSON, evicting the least recently used entry if full."""
+    _list_cache[user_id] = (key, time.monotonic() + LIST_CACHE_TTL, body)
+    _list_cache.move_to_end(user_id)
+    if len(_list_cache) > LIST_CACHE_MAX_SIZE:
+        _list_cache.popitem(last=False)
+
+
+def invalidate_list_cache(user_id: UUID) -> None:
+    """Drop a user's cached document list after one of their documents changed."""
+    _list_cache.pop(user_id, None)
+
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 
+def _document_response(document: Document) -> DocumentResponse:
+    """
+    Build a DocumentResponse from a Document row without re-validating it.
+
+    The row was just read from or written by the database, so its fields
+    already have the right types; model_construct skips pydantic's
+    validation pass. Inbound DocumentCreate/DocumentUpdate bodies are still
+    validated normally.
+    """
+    return DocumentResponse.model_construct(
+        id=document.id,
+        profile_id=document.profile_id,
+        title=document.title,
+        content=document.content,
+        created_at=document.created_at,
+        updated_at=document.updated_at
+    )
+
+
 @router.get("/", response_model=DocumentListResponse)
 async def list_documents(
     current_user_id: UUID = Depends(get_current_user),
@@ -66,30 +107,52 @@ async def list_documents(
     Get all documents for the authenticated user.
     Returns a list with minimal document information for performance.
     """
-    # Get documents for the current user
-    result = await db.execute(
-        select(Document)
+    # Cheap probe that changes whenever the user's list would change; on a hit
+    # the cached bytes go straight out without selecting or encoding any rows
+    cache_key = tuple((await db.execute(
+        select(func.count(), func.max(Document.updated_at))
+        .where(Document.profile_id == current_user_id)
+    )).one())
+    cached_body = _get_cached_list(current_user_id, cache_key)
+    if cached_body is not None:
+        return Response(content=cached_body, media_type="application/json")
+
+    # Get documents for the current user. Only the columns the list needs are
+    # selected; the preview is stored on write, so content is never read here.
+    # Rows are streamed from a server-side cursor in batches, so large lists
+    # aren't buffered whole.
+    result = await db.stream(
+        select(
+            Document.id,
+            Document.title,
+            Document.content_preview,
+            Document.created_at,
+            Document.updated_at
+        )
         .where(Document.profile_id == current_user_id)
         .order_by(Document.updated_at.desc())
+        .execution_options(yield_per=LIST_DOCUMENTS_BATCH_SIZE)
     )
-    documents = result.scalars().all()
     
     # Convert to list items with content preview
     document_items = [
         DocumentListItem(
-            id=doc.id,
-            title=doc.title,
-            content_preview=create_content_preview(doc.content or ""),
-            created_at=doc.created_at,
-            updated_at=doc.updated_at
+            id=doc_id,
+            title=title,
+            content_preview=content_preview or "",
+            created_at=created_at,
+            updated_at=updated_at
         )
-        for doc in documents
+        async for doc_id, title, content_preview, created_at, updated_at in result
     ]
     
-    return DocumentListResponse(
+    body = DocumentListResponse(
         documents=document_items,
         total=len(document_items)
-    )
+    ).model_dump_json().encode()
+    _cache_list(current_user_id, cache_key, body)
+    
+    return Response(content=body, media_type="application/json")
 
 
 @router.post("/", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
@@ -105,14 +168,17 @@ async def create_document(
     new_document = Document(
         profile_id=current_user_id,
         title=document_data.title,
-        content=document_data.content
+        content=document_data.content,
+        content_preview=create_content_preview(document_data.content)
     )
     
+    # The INSERT returns the server-generated timestamps (eager_defaults), so
+    # no refresh is needed after committing
     db.add(new_document)
     await db.commit()
-    await db.refresh(new_document)
+    invalidate_list_cache(current_user_id)
     
-    return DocumentResponse.model_validate(new_document)
+    return _document_response(new_document)
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
@@ -140,7 +206,7 @@ async def get_document(
             detail="Document not found"
         )
     
-    return DocumentResponse.model_validate(document)
+    return _document_response(document)
 
 
 @router.put("/{document_id}", response_model=DocumentResponse)
@@ -155,40 +221,52 @@ async def update_document(
     Only allows updating documents owned by the authenticated user.
     Automatically creates a version history entry before updating.
     """
-    # Get the document
-    result = await db.execute(
-        select(Document)
+    owned_document = and_(
+        Document.id == document_id,
+        Document.profile_id == current_user_id
+    )
+    
+    # Archive the current version before updating. Copying the content with
+    # INSERT ... SELECT means it never has to be read into Python first.
+    archive_current_version = insert(DocumentVersion).from_select(
+        ["id", "document_id", "content"],
+        select(func.gen_random_uuid(), Document.id, Document.content)
         .where(
-            Document.id == document_id,
-            Document.profile_id == current_user_id
+            owned_document,
+            Document.content.is_not(None)  # Only create version if there's existing content
         )
+    ).cte("archive_current_version")
+    
+    # Update fields that were provided, getting the updated row back directly.
+    # The archive INSERT rides along as a CTE, so this is one round-trip; all
+    # parts of the statement see the same snapshot, so the pre-update content
+    # is what gets archived.
+    update_data = document_data.model_dump(exclude_unset=True)
+    if "content" in update_data:
+        # Keep the stored list preview in sync with the new content
+        update_data["content_preview"] = create_content_preview(update_data["content"] or "")
+    result = await db.execute(
+        update(Document)
+        .where(owned_document)
+        .values(**update_data)
+        .returning(Document)
+        .add_cte(archive_current_version)
     )
     document = result.scalar_one_or_none()
     
     if not document:
+        # Nothing was archived or updated; just end the transaction
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    # Archive the current version before updating
-    if document.content is not None:  # Only create version if there's existing content
-        version = DocumentVersion(
-            document_id=document.id,
-            content=document.content
-        )
-        db.add(version)
-    
-    # Update fields that were provided
-    update_data = document_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(document, field, value)
-    
     # Commit both the version and the document update atomically
     await db.commit()
-    await db.refresh(document)
+    invalidate_list_cache(current_user_id)
     
-    return DocumentResponse.model_validate(document)
+    return _document_response(document)
 
 
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -201,24 +279,28 @@ async def delete_document(
     Delete a specific document by ID.
     Only allows deleting documents owned by the authenticated user.
     """
-    # Get the document
+    # Delete in one statement; no returned row means there was nothing to
+    # delete. Versions and dismissals are removed by the foreign keys'
+    # ON DELETE CASCADE rather than being loaded and deleted by the ORM.
     result = await db.execute(
-        select(Document)
+        delete(Document)
         .where(
             Document.id == document_id,
             Document.profile_id == current_user_id
         )
+        .returning(Document.id)
     )
-    document = result.scalar_one_or_none()
+    deleted_id = result.scalar_one_or_none()
     
-    if not document:
+    if not deleted_id:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    await db.delete(document)
     await db.commit()
+    invalidate_list_cache(current_user_id)
     
     # Return 204 No Content (no response body for successful deletion)
 
@@ -235,34 +317,31 @@ async def list_document_versions(
     Get all versions of a specific document.
     Only returns versions for documents owned by the authenticated user.
     """
-    # First verify the user owns this document
-    document_result = await db.execute(
-        select(Document.id)
+    # Check ownership and load the versions in one query. The outer join still
+    # yields a (document_id, None) row for an owned document with no versions,
+    # so no rows at all means the document doesn't exist for this user.
+    result = await db.execute(
+        select(Document.id, DocumentVersion)
+        .outerjoin(DocumentVersion, DocumentVersion.document_id == Document.id)
         .where(
             Document.id == document_id,
             Document.profile_id == current_user_id
         )
+        .order_by(DocumentVersion.saved_at.desc())
     )
-    document = document_result.scalar_one_or_none()
+    rows = result.all()
     
-    if not document:
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    # Get all versions for this document
-    versions_result = await db.execute(
-        select(DocumentVersion)
-        .where(DocumentVersion.document_id == document_id)
-        .order_by(DocumentVersion.saved_at.desc())
-    )
-    versions = versions_result.scalars().all()
-    
     # Convert to response format
     version_responses = [
         DocumentVersionResponse.model_validate(version)
-        for version in versions
+        for _, version in rows
+        if version is not None
     ]
     
     return DocumentVersionListResponse(
@@ -271,6 +350,49 @@ async def list_document_versions(
     )
 
 
+# Declared before /versions/{version_id} so "summary" isn't parsed as a version ID
+@router.get("/{document_id}/versions/summary", response_model=DocumentVersionSummaryListResponse)
+async def list_document_version_summaries(
+    document_id: UUID,
+    current_user_id: UUID = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """
+    Get the version history of a document without each version's content.
+    Clients can fetch a version's content on demand from /versions/{version_id}.
+    """
+    # Check ownership and load the versions in one query (see
+    # list_document_versions), selecting only the metadata columns so version
+    # contents are never loaded
+    result = await db.execute(
+        select(Document.id, DocumentVersion.id, DocumentVersion.saved_at)
+        .outerjoin(DocumentVersion, DocumentVersion.document_id == Document.id)
+        .where(
+            Document.id == document_id,
+            Document.profile_id == current_user_id
+        )
+        .order_by(DocumentVersion.saved_at.desc())
+    )
+    rows = result.all()
+    
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    version_summaries = [
+        DocumentVersionSummary(id=version_id, document_id=doc_id, saved_at=saved_at)
+        for doc_id, version_id, saved_at in rows
+        if version_id is not None
+    ]
+    
+    return DocumentVersionSummaryListResponse(
+        versions=version_summaries,
+        total=len(version_summaries)
+    )
+
+
 @router.get("/{document_id}/versions/{version_id}", response_model=DocumentVersionResponse)
 async def get_document_version(
     document_id: UUID,
@@ -282,31 +404,31 @@ async def get_document_version(
     Get a specific version of a document.
     Only returns versions for documents owned by the authenticated user.
     """
-    # First verify the user owns this document
-    document_result = await db.execute(
-        select(Document.id)
+    # Check ownership and load the version in one query. The outer join keeps
+    # "document not found" and "version not found" distinguishable.
+    result = await db.execute(
+        select(Document.id, DocumentVersion)
+        .outerjoin(
+            DocumentVersion,
+            and_(
+                DocumentVersion.document_id == Document.id,
+                DocumentVersion.id == version_id
+            )
+        )
         .where(
             Document.id == document_id,
             Document.profile_id == current_user_id
         )
     )
-    document = document_result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not document:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    # Get the specific version
-    version_result = await db.execute(
-        select(DocumentVersion)
-        .where(
-            DocumentVersion.id == version_id,
-            DocumentVersion.document_id == document_id
-        )
-    )
-    version = version_result.scalar_one_or_none()
+    _, version = row
     
     if not version:
         raise HTTPException(
@@ -328,31 +450,31 @@ async def restore_document_version(
     Restore a document to a specific version.
     This creates a new version with the current content before restoring.
     """
-    # First verify the user owns this document
-    document_result = await db.execute(
-        select(Document)
+    # Load the document and the version to restore in one query. The outer
+    # join keeps "document not found" and "version not found" distinguishable.
+    result = await db.execute(
+        select(Document, DocumentVersion)
+        .outerjoin(
+            DocumentVersion,
+            and_(
+                DocumentVersion.document_id == Document.id,
+                DocumentVersion.id == version_id
+            )
+        )
         .where(
             Document.id == document_id,
             Document.profile_id == current_user_id
         )
     )
-    document = document_result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not document:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
     
-    # Get the version to restore
-    version_result = await db.execute(
-        select(DocumentVersion)
-        .where(
-            DocumentVersion.id == version_id,
-            DocumentVersion.document_id == document_id
-        )
-    )
-    version = version_result.scalar_one_or_none()
+    document, version = row
     
     if not version:
         raise HTTPException(
@@ -370,13 +492,15 @@ async def restore_document_version(
     
     # Restore the document to the version content
     document.content = version.content
+    document.content_preview = create_content_preview(version.content or "")
     
-    # Commit both operations atomically
+    # Commit both operations atomically. The UPDATE returns the new updated_at
+    # (eager_defaults), so no refresh is needed.
     await db.commit()
-    await db.refresh(document)
+    invalidate_list_cache(current_user_id)
     
     return RestoreVersionResponse(
         success=True,
         message=f"Document restored to version from {version.saved_at}",
-        document=DocumentResponse.model_validate(document)
+        document=_document_response(document)
     ) 
\ No newline at end of file
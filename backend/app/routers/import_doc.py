@@ -1,9 +1,20 @@
 # /backend/app/routers/import_doc.py
 
-from typing import Any
+from typing import Any, Iterable, Iterator, Optional
 from uuid import UUID
+import asyncio
+import gc
+import hashlib
 import io
 import os
+import logging
+import multiprocessing
+import threading
+import zipfile
+from collections import OrderedDict
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,25 +23,201 @@ import sentry_sdk
 from ..database import get_db_session
 from ..auth import get_current_user
 from ..models import Document
+from ..previews import create_content_preview
 from ..schemas import DocumentResponse
+from .documents import invalidate_list_cache
+
+logger = logging.getLogger(__name__)
 
 # Import parsing libraries
 try:
     import docx
+    from docx.oxml.ns import qn
+    from lxml import etree  # Installed with python-docx, which parses with it
+    
+    # WordprocessingML tags read when streaming a DOCX body
+    _W_BODY = qn('w:body')
+    _W_P = qn('w:p')
+    _W_R = qn('w:r')
+    _W_HYPERLINK = qn('w:hyperlink')
+    _W_T = qn('w:t')
+    _W_BR = qn('w:br')
+    _W_TYPE = qn('w:type')
+    # Fixed text of the other run children, as python-docx renders them
+    _W_RUN_CHARACTERS = {
+        qn('w:tab'): '\t',
+        qn('w:ptab'): '\t',
+        qn('w:cr'): '\n',
+        qn('w:noBreakHyphen'): '-',
+    }
 except ImportError:
     docx = None
 
 try:
     import fitz  # PyMuPDF
+    
+    # PyMuPDF's defaults for plain text extraction, minus ligature
+    # preservation (so "ﬁ" imports as "fi")
+    PDF_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES
+    
+    # Don't write MuPDF's per-object warnings for malformed PDFs to stderr as
+    # pages are parsed; they are still collected in fitz.TOOLS.mupdf_warnings()
+    fitz.TOOLS.mupdf_display_errors(False)
 except ImportError:
     fitz = None
 
 # File size limit (30MB in bytes)
 MAX_FILE_SIZE = 30 * 1024 * 1024
 
+# Uploads are read in chunks of this size so oversize files are rejected as
+# soon as they cross the limit rather than after being read in full
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+
 # Supported file extensions
 SUPPORTED_EXTENSIONS = {".txt", ".pdf", ".docx"}
 
+# --- HTML Escaping ---
+# Imported text is untrusted and ends up inside the HTML the editor renders,
+# so every extractor escapes it before wrapping it in <p> tags: a "<script>"
+# typed into an uploaded file must come back as text, never as markup.
+# Escapes extracted text for HTML in a single C-level pass
+_HTML_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+# Same, also turning line breaks into <br> tags in that pass (translate never
+# re-escapes its own replacements)
+_HTML_ESCAPE_BR_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\n': '<br>'})
+
+# --- Parse Process Pool ---
+# PDF/DOCX parsing is CPU-bound pure Python/C work that holds the GIL, so it
+# runs in separate processes: concurrent uploads parse in parallel and the
+# event loop stays free. The pool is created and shut down by the app
+# lifespan; without it (e.g. scripts) parsing falls back to a thread.
+# NOTE: The pool is per worker process, and each of its workers is a full
+# spawned interpreter. With `gunicorn -w 4` the total is 4 * IMPORT_PARSE_WORKERS
+# parse processes, so the default stays small.
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", "2"))
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def _create_parse_pool() -> ProcessPoolExecutor:
+    """Create a process pool for parsing uploaded files."""
+    # spawn rather than fork: forking a process that's running an event
+    # loop and background threads isn't safe
+    return ProcessPoolExecutor(
+        max_workers=IMPORT_PARSE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def start_parse_pool() -> None:
+    """Create the process pool used for parsing uploaded files."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = _create_parse_pool()
+
+
+def _replace_broken_parse_pool(broken_pool: ProcessPoolExecutor) -> None:
+    """
+    Swap a broken parse pool for a fresh one.
+    
+    A worker that dies (a MuPDF crash, an OOM kill) breaks the whole pool and
+    every later submit fails with BrokenProcessPool. Concurrent requests that
+    saw the same breakage only rebuild it once, and a pool that was shut down
+    by the lifespan is not brought back.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is broken_pool:
+            _parse_pool = _create_parse_pool()
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_parse_pool() -> None:
+    """Shut down the parse process pool, cancelling queued work."""
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def parse_in_pool(file_content: bytes, filename: str) -> str:
+    """
+    Extract text from an uploaded file off the event loop.
+    
+    Runs extract_text_from_file in the parse process pool (or a thread when
+    no pool was started). If the pool is broken, it is rebuilt and the parse
+    retried once. A file that breaks the fresh pool as well is most likely
+    what crashed it, so it is rejected instead of being retried again.
+    
+    Args:
+        file_content: Raw file content
+        filename: Original filename
+        
+    Returns:
+        str: Extracted text content
+        
+    Raises:
+        ValueError: If the file can't be parsed, including when it crashes a
+        parse worker twice
+    """
+    loop = asyncio.get_running_loop()
+    for _ in range(2):
+        pool = _parse_pool
+        if pool is None:
+            return await asyncio.to_thread(extract_text_from_file, file_content, filename)
+        try:
+            return await loop.run_in_executor(pool, extract_text_from_file, file_content, filename)
+        except BrokenProcessPool:
+            logger.warning("Parse process pool broke while parsing %s; rebuilding it", filename)
+            _replace_broken_parse_pool(pool)
+    
+    # Not retried in a thread: whatever killed the worker process would take
+    # the server down with it
+    raise ValueError("The file could not be parsed")
+
+
+# --- Extracted Text Cache ---
+# Users often re-upload the same file (e.g. after a failed or abandoned
+# import). Extracted HTML is kept per (content digest, extension), so a
+# repeat upload skips parsing entirely. Results can be megabytes each, so the
+# LRU is bounded by total length as well as entry count, and extractions too
+# large to be worth holding aren't cached at all.
+IMPORT_CACHE_MAX_SIZE = 64
+IMPORT_CACHE_MAX_TEXT_LENGTH = 1_000_000  # characters; larger extractions aren't cached
+IMPORT_CACHE_MAX_TOTAL_LENGTH = 8_000_000  # characters across all entries
+_extracted_texts: "OrderedDict[tuple[bytes, str], str]" = OrderedDict()
+_extracted_texts_total_length = 0
+
+
+def _get_cached_extraction(key: tuple[bytes, str]) -> Optional[str]:
+    """Return previously extracted HTML for a file digest, if cached."""
+    extracted_text = _extracted_texts.get(key)
+    if extracted_text is not None:
+        _extracted_texts.move_to_end(key)
+    return extracted_text
+
+
+def _cache_extraction(key: tuple[bytes, str], extracted_text: str) -> None:
+    """Cache extracted HTML, evicting the least recently used entries while over either bound."""
+    global _extracted_texts_total_length
+    if len(extracted_text) > IMPORT_CACHE_MAX_TEXT_LENGTH:
+        return
+    
+    previous = _extracted_texts.pop(key, None)
+    if previous is not None:
+        _extracted_texts_total_length -= len(previous)
+    _extracted_texts[key] = extracted_text
+    _extracted_texts_total_length += len(extracted_text)
+    while (
+        len(_extracted_texts) > IMPORT_CACHE_MAX_SIZE
+        or _extracted_texts_total_length > IMPORT_CACHE_MAX_TOTAL_LENGTH
+    ):
+        _, evicted_text = _extracted_texts.popitem(last=False)
+        _extracted_texts_total_length -= len(evicted_text)
+
+
 router = APIRouter(prefix="/import", tags=["import"])
 
 
@@ -39,15 +226,10 @@ def extract_text_from_txt(file_content: bytes) -> str:
     try:
         text = file_content.decode('utf-8')
     except UnicodeDecodeError:
-        # Try other common encodings
-        for encoding in ['latin-1', 'cp1252', 'iso-8859-1']:
-            try:
-                text = file_content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise ValueError("Unable to decode text file with supported encodings")
+        # Fall back to Latin-1 with a single decode. It maps every byte to a
+        # character, so it can't fail, and any encodings tried after it
+        # would never be reached.
+        text = file_content.decode('latin-1')
     
     # Convert text to HTML paragraphs for TipTap editor
     # Split by double line breaks first (paragraph separators)
@@ -55,15 +237,48 @@ def extract_text_from_txt(file_content: bytes) -> str:
     
     # For each paragraph, replace single line breaks with <br> tags
     html_paragraphs = []
-    for paragraph in paragraphs:
-        if paragraph.strip():
-            # Replace single line breaks with <br> tags within paragraphs
-            formatted_paragraph = paragraph.strip().replace('\n', '<br>')
+    for paragraph in map(str.strip, paragraphs):
+        if paragraph:
+            # Escape for HTML and replace single line breaks with <br> tags
+            # within paragraphs
+            formatted_paragraph = paragraph.translate(_HTML_ESCAPE_BR_TABLE)
             html_paragraphs.append(f'<p>{formatted_paragraph}</p>')
     
     return ''.join(html_paragraphs) if html_paragraphs else '<p></p>'
 
 
+def docx_main_part_name(package: zipfile.ZipFile) -> str:
+    """Find the main document part of a DOCX package from its root relationships."""
+    with package.open('_rels/.rels') as rels:
+        for relationship in etree.parse(rels).getroot():
+            if relationship.get('Type', '').endswith('/officeDocument'):
+                return relationship.get('Target', '').lstrip('/')
+    raise ValueError("No main document part found")
+
+
+def docx_paragraph_text(paragraph) -> str:
+    """
+    Get the text of a w:p element the way python-docx's Paragraph.text does:
+    from runs directly in the paragraph or inside hyperlinks, with tabs and
+    text-wrapping breaks rendered as characters.
+    """
+    pieces = []
+    for child in paragraph.iterchildren(_W_R, _W_HYPERLINK):
+        runs = child.iterchildren(_W_R) if child.tag == _W_HYPERLINK else (child,)
+        for run in runs:
+            for element in run.iterchildren():
+                tag = element.tag
+                if tag == _W_T:
+                    pieces.append(element.text or '')
+                elif tag == _W_BR:
+                    # Page and column breaks have no text
+                    if element.get(_W_TYPE, 'textWrapping') == 'textWrapping':
+                        pieces.append('\n')
+                elif tag in _W_RUN_CHARACTERS:
+                    pieces.append(_W_RUN_CHARACTERS[tag])
+    return ''.join(pieces)
+
+
 def extract_text_from_docx(file_content: bytes) -> str:
     """Extract text from a DOCX file."""
     if not docx:
@@ -73,24 +288,101 @@ def extract_text_from_docx(file_content: bytes) -> str:
         )
     
     try:
-        # Create a BytesIO object from the file content
-        file_stream = io.BytesIO(file_content)
-        doc = docx.Document(file_stream)
-        
-        # Extract text from all paragraphs and convert to HTML
+        # Stream the main document XML straight out of the zip instead of
+        # loading it with docx.Document, which reads every part of the package
+        # and keeps the whole parsed tree in memory. Only body-level
+        # paragraphs are used, as with doc.paragraphs.
         html_paragraphs = []
-        for paragraph in doc.paragraphs:
-            text = paragraph.text.strip()
-            if text:
-                # Handle line breaks within the paragraph text
-                formatted_text = text.replace('\n', '<br>')
-                html_paragraphs.append(f'<p>{formatted_text}</p>')
+        with zipfile.ZipFile(io.BytesIO(file_content)) as package:
+            with package.open(docx_main_part_name(package)) as document_xml:
+                for _, paragraph in etree.iterparse(
+                    document_xml, events=('end',), tag=_W_P, resolve_entities=False
+                ):
+                    body = paragraph.getparent()
+                    if body.tag != _W_BODY:
+                        continue  # Paragraphs in tables, text boxes, etc.
+                    
+                    text = docx_paragraph_text(paragraph).strip()
+                    if text:
+                        # Escape for HTML and handle line breaks within the paragraph text
+                        formatted_text = text.translate(_HTML_ESCAPE_BR_TABLE)
+                        html_paragraphs.append(f'<p>{formatted_text}</p>')
+                    
+                    # Free this paragraph and everything before it (including
+                    # skipped tables) as parsing moves on
+                    paragraph.clear()
+                    while paragraph.getprevious() is not None:
+                        del body[0]
         
         return ''.join(html_paragraphs) if html_paragraphs else '<p></p>'
     except Exception as e:
         raise ValueError(f"Failed to parse DOCX file: {str(e)}")
 
 
+def infer_pdf_paragraphs(text: str) -> Iterator[str]:
+    """
+    Yield paragraphs inferred from line shapes, for a PDF whose text is a
+    single block with no blank lines.
+    """
+    current_paragraph = []
+    current_length = 0  # len(' '.join(current_paragraph)), kept incrementally
+    # Cheap integer checks come before string checks in each condition, and
+    # current_length > 100 already implies current_paragraph is non-empty
+    for line in map(str.strip, text.split('\n')):
+        if not line:
+            # Empty line - end current paragraph if it has content
+            if current_paragraph:
+                yield ' '.join(current_paragraph)
+                current_paragraph = []
+                current_length = 0
+        elif len(line) > 50 and line[-1] in '.!?':
+            # Likely end of a sentence/paragraph (long line ending with punctuation)
+            current_paragraph.append(line)
+            yield ' '.join(current_paragraph)
+            current_paragraph = []
+            current_length = 0
+        elif current_length > 100 and line[0].isupper():
+            # New line starting with capital letter, and current paragraph is substantial
+            # Treat as new paragraph
+            yield ' '.join(current_paragraph)
+            current_paragraph = [line]
+            current_length = len(line)
+        else:
+            current_length += len(line) + (1 if current_paragraph else 0)
+            current_paragraph.append(line)
+    
+    # Add any remaining content
+    if current_paragraph:
+        yield ' '.join(current_paragraph)
+
+
+def split_pdf_paragraphs(page_texts: Iterable[str]) -> Iterator[str]:
+    """
+    Yield the paragraphs of a PDF, given the stripped text of each non-empty page.
+    
+    Pages and blank lines separate paragraphs. If there's only one page with no
+    blank lines (common with PDFs), paragraphs are inferred from line shapes.
+    Pages are consumed lazily: only the first two are read before paragraphs
+    start flowing, so a long PDF never has all of its text in memory at once.
+    """
+    pages = iter(page_texts)
+    first_page = next(pages, None)
+    if first_page is None:
+        return
+    
+    second_page = next(pages, None)
+    if second_page is None:
+        if '\n\n' in first_page:
+            yield from first_page.split('\n\n')
+        else:
+            # More intelligent paragraph detection for a single block of text
+            yield from infer_pdf_paragraphs(first_page)
+        return
+    
+    for page_text in chain((first_page, second_page), pages):
+        yield from page_text.split('\n\n')
+
+
 def extract_text_from_pdf(file_content: bytes) -> str:
     """Extract text from a PDF file."""
     if not fitz:
@@ -99,67 +391,43 @@ def extract_text_from_pdf(file_content: bytes) -> str:
             detail="PDF parsing not available"
         )
     
+    # Page and text objects are created and dropped by the thousand on long
+    # PDFs, triggering frequent cyclic garbage collection passes that find
+    # nothing to free. Pause the collector for the extraction (it normally
+    # runs in a parse worker process) and restore the previous state after.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
     try:
-        # Open PDF document directly from bytes
-        pdf_document = fitz.open(stream=file_content, filetype="pdf")
-        
-        # Extract text from all pages and combine
-        all_text = []
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            text = page.get_text()
-            if text.strip():
-                all_text.append(text.strip())
-        
-        pdf_document.close()
-        
-        # Combine all page text
-        full_text = '\n\n'.join(all_text)
-        
-        # More intelligent paragraph detection for PDFs
-        # First try splitting by double line breaks
-        paragraphs = full_text.split('\n\n')
-        
-        # If we only get one paragraph (common with PDFs), try different strategies
-        if len(paragraphs) == 1:
-            lines = full_text.split('\n')
-            paragraphs = []
-            current_paragraph = []
+        # Open PDF document directly from bytes; the context manager closes it
+        # even if extraction fails partway
+        with fitz.open(stream=file_content, filetype="pdf") as pdf_document:
+            # Extract text page by page as paragraphs are consumed. Iterating
+            # the document loads each page once, in order, with extraction
+            # limited to plain text in content-stream order (no sorting pass)
+            page_texts = (
+                text
+                for text in (
+                    page.get_text("text", flags=PDF_TEXT_FLAGS, sort=False).strip()
+                    for page in pdf_document
+                )
+                if text
+            )
             
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    # Empty line - end current paragraph if it has content
-                    if current_paragraph:
-                        paragraphs.append(' '.join(current_paragraph))
-                        current_paragraph = []
-                elif (line.endswith('.') or line.endswith('!') or line.endswith('?')) and len(line) > 50:
-                    # Likely end of a sentence/paragraph (long line ending with punctuation)
-                    current_paragraph.append(line)
-                    paragraphs.append(' '.join(current_paragraph))
-                    current_paragraph = []
-                elif line[0].isupper() and len(current_paragraph) > 0 and len(' '.join(current_paragraph)) > 100:
-                    # New line starting with capital letter, and current paragraph is substantial
-                    # Treat as new paragraph
-                    paragraphs.append(' '.join(current_paragraph))
-                    current_paragraph = [line]
-                else:
-                    current_paragraph.append(line)
-            
-            # Add any remaining content
-            if current_paragraph:
-                paragraphs.append(' '.join(current_paragraph))
+            # HTML is written straight to one buffer, so memory grows with the
+            # output rather than holding every page's text plus a paragraph list
+            html_output = io.StringIO()
+            for paragraph in split_pdf_paragraphs(page_texts):
+                text = paragraph.strip()
+                if text:
+                    # Don't add <br> tags since we've already combined lines into paragraphs
+                    html_output.write(f'<p>{text.translate(_HTML_ESCAPE_TABLE)}</p>')
         
-        html_paragraphs = []
-        for paragraph in paragraphs:
-            text = paragraph.strip()
-            if text:
-                # Don't add <br> tags since we've already combined lines into paragraphs
-                html_paragraphs.append(f'<p>{text}</p>')
-        
-        return ''.join(html_paragraphs) if html_paragraphs else '<p></p>'
+        return html_output.getvalue() or '<p></p>'
     except Exception as e:
         raise ValueError(f"Failed to parse PDF file: {str(e)}")
+    finally:
+        if gc_was_enabled:
+            gc.enable()
 
 
 def get_file_extension(filename: str) -> str:
@@ -207,9 +475,27 @@ async def import_file(
             detail=f"Unsupported file format. Supported formats: {', '.join(SUPPORTED_EXTENSIONS)}"
         )
     
-    # Read file content
+    # Parsing happens in a worker process, which can't send an HTTPException
+    # back, so check here that the parsing library is installed
+    if (extension == ".docx" and not docx) or (extension == ".pdf" and not fitz):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"{extension[1:].upper()} parsing not available"
+        )
+    
+    # Starlette records the upload's size while spooling it (to a temporary
+    # file past 1MB), so an oversize file is rejected without reading any of
+    # it back into memory
+    file_too_large = file.size is not None and file.size > MAX_FILE_SIZE
+    
+    # Read file content in chunks, checking the size as we go in case the
+    # size wasn't recorded. The parse helpers accept the bytearray as-is, so
+    # it's never copied into bytes.
+    file_content = bytearray()
     try:
-        file_content = await file.read()
+        while not file_too_large and (chunk := await file.read(UPLOAD_READ_CHUNK_SIZE)):
+            file_content += chunk
+            file_too_large = len(file_content) > MAX_FILE_SIZE
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(
@@ -218,7 +504,7 @@ async def import_file(
         )
     
     # Check file size
-    if len(file_content) > MAX_FILE_SIZE:
+    if file_too_large:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail=f"File size exceeds maximum limit of {MAX_FILE_SIZE // (1024 * 1024)}MB"
@@ -226,8 +512,7 @@ async def import_file(
     
     # Extract text from file
     try:
-        print(f"Starting to parse {extension} file: {file.filename}")
-        print(f"File size: {len(file_content)} bytes")
+        logger.debug("Starting to parse %s file: %s (%d bytes)", extension, file.filename, len(file_content))
         
         with sentry_sdk.start_span(
             op="file.parse",
@@ -236,14 +521,24 @@ async def import_file(
             span.set_data("file.extension", extension)
             span.set_data("file.size", len(file_content))
             
-            extracted_text = extract_text_from_file(file_content, file.filename)
+            # Hashing a large upload takes a few ms; hashlib releases the GIL,
+            # so do it in a thread
+            file_hash = await asyncio.to_thread(hashlib.blake2b, file_content, digest_size=16)
+            cache_key = (file_hash.digest(), extension)
+            extracted_text = _get_cached_extraction(cache_key)
+            span.set_data("cache.hit", extracted_text is not None)
+            
+            if extracted_text is None:
+                # Parse off the event loop (worker process, or thread as fallback)
+                extracted_text = await parse_in_pool(file_content, file.filename)
+                _cache_extraction(cache_key, extracted_text)
             
             span.set_data("extracted.length", len(extracted_text))
-            print(f"Successfully extracted {len(extracted_text)} characters")
+            logger.debug("Successfully extracted %d characters", len(extracted_text))
             
     except ValueError as e:
         # Log the detailed error for debugging
-        print(f"ValueError during file parsing: {str(e)}")
+        logger.warning("ValueError during file parsing: %s", e)
         sentry_sdk.capture_exception(e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -251,7 +546,7 @@ async def import_file(
         )
     except Exception as e:
         # Log the detailed error for debugging
-        print(f"Unexpected error during file parsing: {str(e)}")
+        logger.exception("Unexpected error during file parsing: %s", e)
         sentry_sdk.capture_exception(e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -273,12 +568,15 @@ async def import_file(
         new_document = Document(
             profile_id=current_user_id,
             title=document_title,
-            content=extracted_text
+            content=extracted_text,
+            content_preview=create_content_preview(extracted_text)
         )
         
+        # The INSERT returns the server-generated timestamps (eager_defaults), so
+        # no refresh is needed after committing
         db.add(new_document)
         await db.commit()
-        await db.refresh(new_document)
+        invalidate_list_cache(current_user_id)
         
         # Log successful import
         sentry_sdk.add_breadcrumb(
@@ -2,6 +2,7 @@ import os
 import uuid
 import asyncio
 import json
+import logging
 from typing import List, Dict, Set, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,8 +11,8 @@ import sentry_sdk
 from openai import AsyncOpenAI
 
 from ..database import get_db_session
-from ..auth import get_current_user_profile, create_rate_limit_dependency
-from ..models import Profile, Document, DismissedSuggestion
+from ..auth import get_current_user, create_rate_limit_dependency
+from ..models import Document, DismissedSuggestion
 from ..schemas import (
     ParagraphAnalysisRequest,
     SuggestionAnalysisResponse,
@@ -21,6 +22,8 @@ from ..schemas import (
     Suggestion
 )
 
+logger = logging.getLogger(__name__)
+
 # Create rate limit dependency for suggestions
 suggestions_rate_limit = create_rate_limit_dependency(300)  # 300 requests per hour for suggestions
 
@@ -42,7 +45,7 @@ def set_span_attribute(span, key: str, value):
         span.set_data(key, value)
     # Final fallback - just log for debugging
     else:
-        print(f"Warning: Unable to set span attribute {key}={value}, no compatible method found")
+        logger.warning("Unable to set span attribute %s=%s, no compatible method found", key, value)
 
 router = APIRouter(prefix="/suggestions", tags=["Suggestions"])
 
@@ -186,7 +189,7 @@ def select_best_position(positions: List[Tuple[int, int]], used_positions: set)
 @router.post("/analyze", response_model=SuggestionAnalysisResponse)
 async def analyze_paragraphs(
     request_data: ParagraphAnalysisRequest,
-    current_profile: Profile = Depends(suggestions_rate_limit),
+    current_user_id: uuid.UUID = Depends(suggestions_rate_limit),
     db: AsyncSession = Depends(get_db_session)
 ):
     """
@@ -212,7 +215,7 @@ async def analyze_paragraphs(
     document_result = await db.execute(
         select(Document).where(
             Document.id == request_data.document_id,
-            Document.profile_id == current_profile.id
+            Document.profile_id == current_user_id
         )
     )
     document = document_result.scalar_one_or_none()
@@ -231,7 +234,7 @@ async def analyze_paragraphs(
         
         # Get dismissed suggestions for filtering
         dismissed_identifiers = await get_dismissed_suggestions(
-            db, current_profile.id, request_data.document_id
+            db, current_user_id, request_data.document_id
         )
         set_span_attribute(span, "dismissed_count", len(dismissed_identifiers))
         
@@ -277,7 +280,7 @@ async def analyze_paragraphs(
                     if not positions:
                         # This can happen when LLM suggests text that doesn't exactly match paragraph content
                         # This is normal and not a user-facing error
-                        print(f"DEBUG: Could not find text '{suggestion_data['original_text']}' in paragraph {paragraph.paragraph_id}")
+                        logger.debug("Could not find text %r in paragraph %s", suggestion_data["original_text"], paragraph.paragraph_id)
                         continue
                     
                     # Select the best available position
@@ -286,7 +289,7 @@ async def analyze_paragraphs(
                     if not selected_position:
                         # This is a normal occurrence when multiple suggestions target the same text
                         # Log it for debugging but don't show it to the user as an error
-                        print(f"DEBUG: All positions for text '{suggestion_data['original_text']}' are already used in paragraph {paragraph.paragraph_id}")
+                        logger.debug("All positions for text %r are already used in paragraph %s", suggestion_data["original_text"], paragraph.paragraph_id)
                         continue
                     
                     relative_start, relative_end = selected_position
@@ -339,7 +342,7 @@ async def analyze_paragraphs(
 @router.post("/dismiss", response_model=DismissSuggestionResponse)
 async def dismiss_suggestion(
     request: DismissSuggestionRequest,
-    current_profile: Profile = Depends(get_current_user_profile),
+    current_user_id: uuid.UUID = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_session)
 ):
     """
@@ -349,7 +352,7 @@ async def dismiss_suggestion(
     document_result = await db.execute(
         select(Document).where(
             Document.id == request.document_id,
-            Document.profile_id == current_profile.id
+            Document.profile_id == current_user_id
         )
     )
     document = document_result.scalar_one_or_none()
@@ -374,7 +377,7 @@ async def dismiss_suggestion(
         
         # Create dismissal record
         dismissal = DismissedSuggestion(
-            profile_id=current_profile.id,
+            profile_id=current_user_id,
             document_id=request.document_id,
             dismissal_identifier=dismissal_identifier
         )
@@ -407,7 +410,7 @@ async def dismiss_suggestion(
 @router.delete("/dismissed/{document_id}", response_model=ClearDismissedResponse)
 async def clear_dismissed_suggestions(
     document_id: uuid.UUID,
-    current_profile: Profile = Depends(get_current_user_profile),
+    current_user_id: uuid.UUID = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_session)
 ):
     """
@@ -417,7 +420,7 @@ async def clear_dismissed_suggestions(
     document_result = await db.execute(
         select(Document).where(
             Document.id == document_id,
-            Document.profile_id == current_profile.id
+            Document.profile_id == current_user_id
         )
     )
     document = document_result.scalar_one_or_none()
@@ -437,7 +440,7 @@ async def clear_dismissed_suggestions(
             # Count dismissed suggestions before deletion
             count_result = await db.execute(
                 select(func.count(DismissedSuggestion.id)).where(
-                    DismissedSuggestion.profile_id == current_profile.id,
+                    DismissedSuggestion.profile_id == current_user_id,
                     DismissedSuggestion.document_id == document_id
                 )
             )
@@ -446,7 +449,7 @@ async def clear_dismissed_suggestions(
             # Delete all dismissed suggestions for this document
             await db.execute(
                 delete(DismissedSuggestion).where(
-                    DismissedSuggestion.profile_id == current_profile.id,
+                    DismissedSuggestion.profile_id == current_user_id,
                     DismissedSuggestion.document_id == document_id
                 )
             )
@@ -241,6 +241,22 @@ class DocumentVersionListResponse(BaseModel):
     total: int
 
 
+class DocumentVersionSummary(BaseModel):
+    """Schema for listing document versions without their content."""
+    id: UUID
+    document_id: UUID
+    saved_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentVersionSummaryListResponse(BaseModel):
+    """Schema for document version summary list response."""
+    versions: List[DocumentVersionSummary]
+    total: int
+
+
 class RestoreVersionRequest(BaseModel):
     """Schema for restoring a document version."""
     version_id: UUID = Field(..., description="ID of the version to restore")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script to verify text extraction for imported files.
+This script parses real files built in memory, without a database or server.
+
+Usage: python test_import_parsing.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add the current directory to the Python path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+# The app only loads .env in main.py, so scripts importing modules directly load it themselves
+load_dotenv()
+
+import io
+
+from app.routers.import_doc import docx, fitz, extract_text_from_file
+
+# Markup typed into an uploaded file, and how it must come back
+HOSTILE_TEXT = "<script>alert('x')</script> & more"
+ESCAPED_TEXT = "&lt;script&gt;alert('x')&lt;/script&gt; &amp; more"
+
+
+def build_pdf(pages):
+    """Build a PDF with one page per list of lines and return its bytes."""
+    pdf_document = fitz.open()
+    for lines in pages:
+        page = pdf_document.new_page()
+        page.insert_text((72, 72), "\n".join(lines))
+    content = pdf_document.tobytes()
+    pdf_document.close()
+    return content
+
+
+def test_pdf_extraction():
+    """Test that a real PDF goes through PyMuPDF with the import's text flags."""
+    print("\n📄 Testing PDF extraction...")
+    if fitz is None:
+        print("⚠️  PyMuPDF is not installed, skipping PDF tests")
+        return True
+
+    passed = True
+
+    from app.routers.import_doc import PDF_TEXT_FLAGS
+    if PDF_TEXT_FLAGS == fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES:
+        print("✅ Text flags are PyMuPDF's defaults without ligature preservation")
+    else:
+        print(f"❌ Unexpected text flags: {PDF_TEXT_FLAGS}")
+        passed = False
+
+    # Uploads are handed to the parser as a bytearray
+    content = bytearray(build_pdf([
+        ["First page paragraph."],
+        ["Second page paragraph."],
+    ]))
+    html = extract_text_from_file(content, "sample.pdf")
+    expected = "<p>First page paragraph.</p><p>Second page paragraph.</p>"
+    if html == expected:
+        print(f"✅ Multi-page PDF extracted: {html}")
+    else:
+        print(f"❌ Multi-page PDF: expected {expected!r}, got {html!r}")
+        passed = False
+
+    html = extract_text_from_file(build_pdf([[]]), "empty.pdf")
+    if html == "<p></p>":
+        print("✅ PDF without text gives an empty paragraph")
+    else:
+        print(f"❌ PDF without text: got {html!r}")
+        passed = False
+
+    return passed
+
+
+def build_docx(paragraphs):
+    """Build a DOCX with the given paragraphs and return its bytes."""
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def test_html_escaping():
+    """Test that markup in uploaded files is escaped, not passed through."""
+    print("\n🛡️ Testing HTML escaping of imported text...")
+
+    expected = f"<p>{ESCAPED_TEXT}</p>"
+    files = {"hostile.txt": HOSTILE_TEXT.encode("utf-8")}
+    if docx is not None:
+        files["hostile.docx"] = build_docx([HOSTILE_TEXT])
+    if fitz is not None:
+        files["hostile.pdf"] = build_pdf([[HOSTILE_TEXT]])
+
+    passed = True
+    for filename, content in files.items():
+        html = extract_text_from_file(content, filename)
+        if html == expected:
+            print(f"✅ {filename}: markup escaped")
+        else:
+            print(f"❌ {filename}: expected {expected!r}, got {html!r}")
+            passed = False
+
+    # Line breaks in text files still become <br> tags next to escaped text
+    html = extract_text_from_file(b"a <b>\nc", "lines.txt")
+    if html == "<p>a &lt;b&gt;<br>c</p>":
+        print("✅ lines.txt: line breaks kept as <br> alongside escaped text")
+    else:
+        print(f"❌ lines.txt: got {html!r}")
+        passed = False
+
+    return passed
+
+
+if __name__ == "__main__":
+    results = [test_pdf_extraction(), test_html_escaping()]
+    if all(results):
+        print("\n🎉 Import parsing tests passed!")
+    else:
+        print("\n❌ Some import parsing tests failed")
+        sys.exit(1)
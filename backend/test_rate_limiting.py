@@ -16,34 +16,54 @@ from pathlib import Path
 # Add the current directory to the Python path so we can import from app
 sys.path.insert(0, str(Path(__file__).parent))
 
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete
+
+# The app only loads .env in main.py, so scripts importing modules directly load it themselves
+load_dotenv()
+
 from app.database import AsyncSessionLocal
 from app.models import Profile
-from app.auth import check_rate_limit
+from app.auth import check_rate_limit, flush_pending_api_calls, invalidate_usage_snapshot
+
+
+async def get_usage(db, profile_id):
+    """Read the current counter values for the test profile."""
+    # Calls are counted in memory and written behind; persist them first
+    await flush_pending_api_calls()
+    result = await db.execute(
+        select(Profile.api_call_count, Profile.rate_limit_reset_at)
+        .where(Profile.id == profile_id)
+    )
+    return result.one()
 
 
 async def test_rate_limiting():
     """Test the rate limiting functionality."""
     print("Testing rate limiting functionality...")
     
-    # Create a mock profile for testing
+    # Create a throwaway profile for testing (the counter lives on the row)
     test_profile_id = uuid4()
-    mock_profile = Profile(
-        id=test_profile_id,
-        api_call_count=0,
-        rate_limit_reset_at=None,
-        email="test@example.com",
-        display_name="Test User"
-    )
     
     async with AsyncSessionLocal() as db:
+        db.add(Profile(
+            id=test_profile_id,
+            api_call_count=0,
+            rate_limit_reset_at=None,
+            email=f"test_{test_profile_id}@example.com",
+            display_name="Test User"
+        ))
+        await db.commit()
+        
         print(f"\n📊 Testing with profile ID: {test_profile_id}")
         
         # Test 1: First request (should succeed)
         print("\n1️⃣ Testing first request (should succeed)...")
         try:
-            result = await check_rate_limit(5, mock_profile, db)  # 5 requests per hour limit
-            print(f"✅ First request succeeded. API call count: {result.api_call_count}")
-            print(f"   Reset time: {result.rate_limit_reset_at}")
+            await check_rate_limit(5, test_profile_id, db)  # 5 requests per hour limit
+            count, reset_at = await get_usage(db, test_profile_id)
+            print(f"✅ First request succeeded. API call count: {count}")
+            print(f"   Reset time: {reset_at}")
         except Exception as e:
             print(f"❌ First request failed: {e}")
         
@@ -51,23 +71,26 @@ async def test_rate_limiting():
         print("\n2️⃣ Testing requests within limit...")
         for i in range(2, 5):  # Make 3 more requests (total of 4, under limit of 5)
             try:
-                result = await check_rate_limit(5, mock_profile, db)
-                print(f"✅ Request {i} succeeded. API call count: {result.api_call_count}")
+                await check_rate_limit(5, test_profile_id, db)
+                count, _ = await get_usage(db, test_profile_id)
+                print(f"✅ Request {i} succeeded. API call count: {count}")
             except Exception as e:
                 print(f"❌ Request {i} failed: {e}")
         
         # Test 3: Exceed rate limit
         print("\n3️⃣ Testing rate limit exceeded...")
         try:
-            result = await check_rate_limit(5, mock_profile, db)
-            print(f"✅ Request 5 succeeded. API call count: {result.api_call_count}")
+            await check_rate_limit(5, test_profile_id, db)
+            count, _ = await get_usage(db, test_profile_id)
+            print(f"✅ Request 5 succeeded. API call count: {count}")
         except Exception as e:
             print(f"✅ Request 5 correctly blocked: {type(e).__name__}")
         
         # Now try one more that should definitely be blocked
         try:
-            result = await check_rate_limit(5, mock_profile, db)
-            print(f"❌ Request 6 should have been blocked but succeeded: {result.api_call_count}")
+            await check_rate_limit(5, test_profile_id, db)
+            count, _ = await get_usage(db, test_profile_id)
+            print(f"❌ Request 6 should have been blocked but succeeded: {count}")
         except Exception as e:
             print(f"✅ Request 6 correctly rate limited")
             # Check if it's the right type of error
@@ -82,12 +105,20 @@ async def test_rate_limiting():
         # Test 4: Rate limit reset (simulate time passing)
         print("\n4️⃣ Testing rate limit reset...")
         # Manually set the reset time to the past to simulate time passing
-        mock_profile.rate_limit_reset_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+        await db.execute(
+            update(Profile)
+            .where(Profile.id == test_profile_id)
+            .values(rate_limit_reset_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+        )
+        await db.commit()
+        # The counter was changed behind the limiter's back; drop its snapshot
+        invalidate_usage_snapshot(test_profile_id)
         
         try:
-            result = await check_rate_limit(5, mock_profile, db)
-            print(f"✅ Rate limit reset works. New API call count: {result.api_call_count}")
-            print(f"   New reset time: {result.rate_limit_reset_at}")
+            await check_rate_limit(5, test_profile_id, db)
+            count, reset_at = await get_usage(db, test_profile_id)
+            print(f"✅ Rate limit reset works. New API call count: {count}")
+            print(f"   New reset time: {reset_at}")
         except Exception as e:
             print(f"❌ Rate limit reset failed: {e}")
         
@@ -95,22 +126,33 @@ async def test_rate_limiting():
         print("\n5️⃣ Testing different rate limits...")
         
         # Reset the profile
-        mock_profile.api_call_count = 0
-        mock_profile.rate_limit_reset_at = None
+        await db.execute(
+            update(Profile)
+            .where(Profile.id == test_profile_id)
+            .values(api_call_count=0, rate_limit_reset_at=None)
+        )
+        await db.commit()
+        invalidate_usage_snapshot(test_profile_id)
         
         # Test with a very restrictive limit
         try:
-            result = await check_rate_limit(1, mock_profile, db)  # Only 1 request per hour
-            print(f"✅ Restrictive limit test 1 succeeded. Count: {result.api_call_count}")
+            await check_rate_limit(1, test_profile_id, db)  # Only 1 request per hour
+            count, _ = await get_usage(db, test_profile_id)
+            print(f"✅ Restrictive limit test 1 succeeded. Count: {count}")
         except Exception as e:
             print(f"❌ Restrictive limit test 1 failed: {e}")
         
         # This should fail
         try:
-            result = await check_rate_limit(1, mock_profile, db)
-            print(f"❌ Restrictive limit test 2 should have failed but succeeded: {result.api_call_count}")
+            await check_rate_limit(1, test_profile_id, db)
+            count, _ = await get_usage(db, test_profile_id)
+            print(f"❌ Restrictive limit test 2 should have failed but succeeded: {count}")
         except Exception as e:
             print(f"✅ Restrictive limit test 2 correctly blocked")
+        
+        # Clean up the test profile
+        await db.execute(delete(Profile).where(Profile.id == test_profile_id))
+        await db.commit()
     
     print("\n🎉 Rate limiting tests completed!")
     print("\n📝 Summary:")
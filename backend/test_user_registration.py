@@ -6,10 +6,14 @@ import sys
 from uuid import uuid4
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
 
 # Add the app directory to the path so we can import our modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
 
+# The app only loads .env in main.py, so scripts importing modules directly load it themselves
+load_dotenv()
+
 from app.database import get_db_session
 from app.models import Profile
 